@@ -3,7 +3,7 @@ from datetime import datetime, timezone
 import secrets
 from typing import Optional, Dict, List
 from pydantic import ValidationError
-from sqlalchemy import func, null, update, select, or_, and_
+from sqlalchemy import func, insert, lambda_stmt, null, update, select, or_, and_
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_email_service, get_settings
@@ -20,6 +20,8 @@ settings = get_settings()
 logger = logging.getLogger(__name__)
 
 class UserService:
+    _lookup_cache_key = "user_service_lookup_cache"
+
     @classmethod
     async def _execute_query(cls, session: AsyncSession, query):
         try:
@@ -37,17 +39,47 @@ class UserService:
         result = await cls._execute_query(session, query)
         return result.scalars().first() if result else None
 
+    @classmethod
+    async def _fetch_cached_user(cls, session: AsyncSession, field: str, value: str) -> Optional[User]:
+        # Remembers the primary key found for each unique lookup on this session, so repeated lookups
+        # resolve through the identity map instead of issuing another SELECT.
+        cache = session.info.setdefault(cls._lookup_cache_key, {})
+        user_id = cache.get((field, value))
+        if user_id is not None:
+            user = await cls.get_by_id(session, user_id)
+            if user is not None and getattr(user, field) == value:
+                return user
+        user = await cls._fetch_user(session, **{field: value})
+        if user is not None:
+            cache[(field, value)] = user.id
+        return user
+
+    @classmethod
+    def _invalidate_lookup_cache(cls, session: AsyncSession) -> None:
+        session.info.pop(cls._lookup_cache_key, None)
+
     @classmethod
     async def get_by_id(cls, session: AsyncSession, user_id: UUID) -> Optional[User]:
-        return await cls._fetch_user(session, id=user_id)
+        try:
+            user_id = UUID(str(user_id))
+        except ValueError:
+            # Malformed ids can never match; skip the round-trip and the failed-cast rollback.
+            logger.info(f"Invalid user ID {user_id!r}.")
+            return None
+        try:
+            return await session.get(User, user_id)
+        except SQLAlchemyError as e:
+            logger.error(f"Database error: {e}")
+            await session.rollback()
+            return None
 
     @classmethod
     async def get_by_nickname(cls, session: AsyncSession, nickname: str) -> Optional[User]:
-        return await cls._fetch_user(session, nickname=nickname)
+        return await cls._fetch_cached_user(session, "nickname", nickname)
 
     @classmethod
     async def get_by_email(cls, session: AsyncSession, email: str) -> Optional[User]:
-        return await cls._fetch_user(session, email=email)
+        return await cls._fetch_cached_user(session, "email", email)
 
     @classmethod
     async def create(cls, session: AsyncSession, user_data: Dict[str, str], email_service: EmailService) -> Optional[User]:
@@ -58,20 +90,21 @@ class UserService:
                 logger.error("User with given email already exists.")
                 return None
             validated_data['hashed_password'] = hash_password(validated_data.pop('password'))
-            new_user = User(**validated_data)
             new_nickname = generate_nickname()
             while await cls.get_by_nickname(session, new_nickname):
                 new_nickname = generate_nickname()
-            new_user.nickname = new_nickname
-            logger.info(f"User Role: {new_user.role}")
+            validated_data['nickname'] = new_nickname
+            logger.info(f"User Role: {validated_data['role']}")
             user_count = await cls.count(session)
-            new_user.role = UserRole.ADMIN if user_count == 0 else UserRole.ANONYMOUS            
-            if new_user.role == UserRole.ADMIN:
-                new_user.email_verified = True
-                
-            new_user.verification_token = generate_verification_token()
+            validated_data['role'] = UserRole.ADMIN if user_count == 0 else UserRole.ANONYMOUS
+            if validated_data['role'] == UserRole.ADMIN:
+                validated_data['email_verified'] = True
 
-            session.add(new_user)
+            validated_data['verification_token'] = generate_verification_token()
+
+            # INSERT ... RETURNING hands back the persisted row, server defaults included, in one round-trip
+            result = await session.execute(insert(User).values(**validated_data).returning(User))
+            new_user = result.scalar_one()
             await session.commit()
             await email_service.send_verification_email(new_user)
             return new_user
@@ -89,9 +122,10 @@ class UserService:
                 validated_data['hashed_password'] = hash_password(validated_data.pop('password'))
             query = update(User).where(User.id == user_id).values(**validated_data).execution_options(synchronize_session="fetch")
             await cls._execute_query(session, query)
+            cls._invalidate_lookup_cache(session)
             updated_user = await cls.get_by_id(session, user_id)
             if updated_user:
-                session.refresh(updated_user)  # Explicitly refresh the updated user object
+                await session.refresh(updated_user)  # Explicitly refresh the updated user object
                 logger.info(f"User {user_id} updated successfully.")
                 return updated_user
             else:
@@ -109,11 +143,20 @@ class UserService:
             return False
         await session.delete(user)
         await session.commit()
+        cls._invalidate_lookup_cache(session)
         return True
 
     @classmethod
-    async def list_users(cls, session: AsyncSession, skip: int = 0, limit: int = 10) -> List[User]:
-        query = select(User).offset(skip).limit(limit)
+    async def list_users(cls, session: AsyncSession, skip: int = 0, limit: int = 10, *, cursor: Optional[UUID] = None) -> List[User]:
+        # Pages by either skip (OFFSET) or cursor (the last id of the previous page), never both. A cursor
+        # page is found through the primary key index, so its cost does not grow with depth the way OFFSET does.
+        if cursor is not None and skip:
+            raise ValueError("skip and cursor are mutually exclusive")
+        query = select(User).order_by(User.id).limit(limit)
+        if cursor is not None:
+            query = query.where(User.id > cursor)
+        else:
+            query = query.offset(skip)
         result = await cls._execute_query(session, query)
         return result.scalars().all() if result else []
 
@@ -201,43 +244,40 @@ class UserService:
         return False
 
     @classmethod
-    async def search_users(cls, session: AsyncSession, search_params: UserFilter, skip: int = 0, limit: int = 10) -> List[User]:
-        query = select(User).offset(skip).limit(limit)
-        
+    def _apply_search_filters(cls, query, search_params: UserFilter):
+        # Each predicate is appended as its own lambda, so SQLAlchemy compiles the statement once per
+        # combination of filters and later calls only bind new values. Lambdas close over plain local
+        # values, never over search_params itself, so those values become bound parameters.
         if search_params.username:
-            query = query.where(User.nickname.ilike(f"%{search_params.username}%"))
+            username_pattern = f"%{search_params.username}%"
+            query += lambda q: q.where(User.nickname.ilike(username_pattern))
         if search_params.email:
-            query = query.where(User.email.ilike(f"%{search_params.email}%"))
+            email_pattern = f"%{search_params.email}%"
+            query += lambda q: q.where(User.email.ilike(email_pattern))
         if search_params.role:
-            query = query.where(User.role == UserRole[search_params.role.upper()])
+            role = UserRole[search_params.role.upper()]
+            query += lambda q: q.where(User.role == role)
         if search_params.account_status is not None:
             if search_params.account_status == "locked":
-                query = query.where(User.is_locked.is_(True))
+                query += lambda q: q.where(User.is_locked.is_(True))
             elif search_params.account_status == "unlocked":
-                query = query.where(User.is_locked.is_(False))
+                query += lambda q: q.where(User.is_locked.is_(False))
         if search_params.start_date and search_params.end_date:
-            query = query.where(and_(User.created_at >= search_params.start_date, User.created_at <= search_params.end_date))
+            start_date, end_date = search_params.start_date, search_params.end_date
+            query += lambda q: q.where(and_(User.created_at >= start_date, User.created_at <= end_date))
+        return query
+
+    @classmethod
+    async def search_users(cls, session: AsyncSession, search_params: UserFilter, skip: int = 0, limit: int = 10) -> List[User]:
+        query = cls._apply_search_filters(lambda_stmt(lambda: select(User)), search_params)
+        query += lambda q: q.offset(skip).limit(limit)
 
         result = await cls._execute_query(session, query)
         return result.scalars().all() if result else []
 
     @classmethod
     async def count_filtered_users(cls, session: AsyncSession, search_params: UserFilter) -> int:
-        query = select(func.count()).select_from(User)
-        
-        if search_params.username:
-            query = query.where(User.nickname.ilike(f"%{search_params.username}%"))
-        if search_params.email:
-            query = query.where(User.email.ilike(f"%{search_params.email}%"))
-        if search_params.role:
-            query = query.where(User.role == UserRole[search_params.role.upper()])
-        if search_params.account_status is not None:
-            if search_params.account_status == "locked":
-                query = query.where(User.is_locked.is_(True))
-            elif search_params.account_status == "unlocked":
-                query = query.where(User.is_locked.is_(False))
-        if search_params.start_date and search_params.end_date:
-            query = query.where(and_(User.created_at >= search_params.start_date, User.created_at <= search_params.end_date))
+        query = cls._apply_search_filters(lambda_stmt(lambda: select(func.count()).select_from(User)), search_params)
 
         result = await cls._execute_query(session, query)
         count = result.scalar()
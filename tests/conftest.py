@@ -8,23 +8,29 @@ Fixtures:
 - `async_client`: Manages an asynchronous HTTP client for testing interactions with the FastAPI application.
 - `db_session`: Handles database transactions to ensure a clean database state for each test.
 - User fixtures (`user`, `locked_user`, `verified_user`, etc.): Set up various user states to test different behaviors under diverse conditions.
+- `search_corpus`: A shared, bulk-inserted set of users covering every search filter.
 - `token`: Generates an authentication token for testing secured endpoints.
 - `initialize_database`: Prepares the database at the session start.
-- `setup_database`: Sets up and tears down the database before and after each test.
+- `test_engine`: Creates the engine and the schema once per test session.
 """
 
 # Standard library imports
 from builtins import Exception, range, str
+import asyncio
+import os
 from datetime import datetime, timedelta
-from unittest.mock import AsyncMock, patch
+from functools import partial
+from itertools import count
+from unittest.mock import AsyncMock, MagicMock, patch
 from uuid import uuid4
 
 # Third-party imports
 import pytest
 from fastapi.testclient import TestClient
 from httpx import AsyncClient
+from sqlalchemy import insert, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker, scoped_session
 from faker import Faker
 
 # Application-specific imports
@@ -40,10 +46,23 @@ from app.services.jwt_service import create_access_token
 fake = Faker()
 
 settings = get_settings()
-TEST_DATABASE_URL = settings.database_url.replace("postgresql://", "postgresql+asyncpg://")
-engine = create_async_engine(TEST_DATABASE_URL, echo=settings.debug)
-AsyncTestingSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-AsyncSessionScoped = scoped_session(AsyncTestingSessionLocal)
+BASE_DATABASE_URL = make_url(settings.database_url.replace("postgresql://", "postgresql+asyncpg://"))
+# every pytest-xdist worker gets its own database so parallel tests never see each other's rows
+XDIST_WORKER = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+TEST_DATABASE_URL = BASE_DATABASE_URL.set(database=f"{BASE_DATABASE_URL.database}_{XDIST_WORKER}")
+
+# bcrypt cost doubles with every round; tests only need a valid hash, not a slow one
+TEST_BCRYPT_ROUNDS = 4
+# hashed once at import and reused by every user fixture instead of one bcrypt run per user
+HASHED_DEFAULT_PASSWORD = hash_password("MySuperPassword$1234", rounds=TEST_BCRYPT_ROUNDS)
+
+
+# one loop for the whole run, so the session-scoped engine and its pooled connections stay usable in every test
+@pytest.fixture(scope="session")
+def event_loop():
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
 
 
 @pytest.fixture
@@ -64,6 +83,11 @@ async def async_client(db_session):
         finally:
             app.dependency_overrides.clear()
 
+@pytest.fixture(scope="session", autouse=True)
+def fast_password_hashing():
+    with patch("app.services.user_service.hash_password", partial(hash_password, rounds=TEST_BCRYPT_ROUNDS)):
+        yield
+
 @pytest.fixture(scope="session", autouse=True)
 def initialize_database():
     try:
@@ -71,24 +95,85 @@ def initialize_database():
     except Exception as e:
         pytest.fail(f"Failed to initialize the database: {str(e)}")
 
-# this function setup and tears down (drops tales) for each test function, so you have a clean database for each test.
-@pytest.fixture(scope="function", autouse=True)
-async def setup_database():
+async def _create_worker_database():
+    """Create this worker's database through a bootstrap connection to the configured one."""
+    bootstrap_engine = create_async_engine(BASE_DATABASE_URL, isolation_level="AUTOCOMMIT")
+    try:
+        async with bootstrap_engine.connect() as conn:
+            exists = await conn.scalar(
+                text("SELECT 1 FROM pg_database WHERE datname = :name"),
+                {"name": TEST_DATABASE_URL.database},
+            )
+            if not exists:
+                await conn.execute(text(f'CREATE DATABASE "{TEST_DATABASE_URL.database}"'))
+    finally:
+        await bootstrap_engine.dispose()
+
+async def _drop_worker_database():
+    """Drop this worker's database so repeated runs do not leave databases behind."""
+    bootstrap_engine = create_async_engine(BASE_DATABASE_URL, isolation_level="AUTOCOMMIT")
+    try:
+        async with bootstrap_engine.connect() as conn:
+            await conn.execute(text(f'DROP DATABASE IF EXISTS "{TEST_DATABASE_URL.database}"'))
+    finally:
+        await bootstrap_engine.dispose()
+
+# the schema is created once per test run; tests are isolated by the SAVEPOINT rollback in db_session instead
+@pytest.fixture(scope="session")
+async def test_engine():
+    await _create_worker_database()
+    engine = create_async_engine(
+        TEST_DATABASE_URL,
+        echo=settings.debug,
+        # sized for concurrent async tests so acquiring a connection never stalls a worker
+        pool_size=10,
+        max_overflow=20,
+        pool_pre_ping=True,
+        pool_recycle=3600,
+        insertmanyvalues_page_size=1000,
+    )
     async with engine.begin() as conn:
+        # drop leftovers from an interrupted run before creating a clean schema
+        await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
-    yield
-    async with engine.begin() as conn:
-        # you can comment out this line during development if you are debugging a single test
-         await conn.run_sync(Base.metadata.drop_all)
+    yield engine
+    # every pooled connection must be closed before the database can be dropped
     await engine.dispose()
+    # you can comment out this line during development if you want to inspect the data a run left behind
+    await _drop_worker_database()
+
+async def _bulk_insert_users(engine, rows):
+    """Insert rows in one batched INSERT ... RETURNING and commit them outside any test transaction."""
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        result = await session.scalars(insert(User).returning(User), rows)
+        users = result.all()
+        await session.commit()
+    return users
 
 @pytest.fixture(scope="function")
-async def db_session(setup_database):
-    async with AsyncSessionScoped() as session:
+async def db_session(test_engine):
+    async with test_engine.connect() as conn:
+        await conn.begin()
+        # the session runs its transactions as SAVEPOINTs, so commits and rollbacks in the code under test
+        # never end the outer transaction, which is rolled back after the test
+        session = AsyncSession(bind=conn, expire_on_commit=False, join_transaction_mode="create_savepoint")
         try:
             yield session
         finally:
             await session.close()
+            await conn.rollback()
+
+# deterministic, run-wide unique nicknames for test payloads, without random sampling or collision retries
+@pytest.fixture(scope="session")
+def nickname_factory():
+    counter = count()
+    return lambda: f"nick_{next(counter)}"
+
+# for tests whose input is rejected by schema validation before any query runs; its coroutine methods are
+# AsyncMocks that succeed when awaited, so tests must assert they were never called
+@pytest.fixture
+def mock_db_session():
+    return MagicMock(spec=AsyncSession)
 
 @pytest.fixture(scope="function")
 async def locked_user(db_session):
@@ -98,7 +183,7 @@ async def locked_user(db_session):
         "first_name": fake.first_name(),
         "last_name": fake.last_name(),
         "email": unique_email,
-        "hashed_password": hash_password("MySuperPassword$1234"),
+        "hashed_password": HASHED_DEFAULT_PASSWORD,
         "role": UserRole.AUTHENTICATED,
         "email_verified": False,
         "is_locked": True,
@@ -116,7 +201,7 @@ async def user(db_session):
         "first_name": fake.first_name(),
         "last_name": fake.last_name(),
         "email": fake.email(),
-        "hashed_password": hash_password("MySuperPassword$1234"),
+        "hashed_password": HASHED_DEFAULT_PASSWORD,
         "role": UserRole.AUTHENTICATED,
         "email_verified": False,
         "is_locked": False,
@@ -133,7 +218,7 @@ async def verified_user(db_session):
         "first_name": fake.first_name(),
         "last_name": fake.last_name(),
         "email": fake.email(),
-        "hashed_password": hash_password("MySuperPassword$1234"),
+        "hashed_password": HASHED_DEFAULT_PASSWORD,
         "role": UserRole.AUTHENTICATED,
         "email_verified": True,
         "is_locked": False,
@@ -150,7 +235,7 @@ async def unverified_user(db_session):
         "first_name": fake.first_name(),
         "last_name": fake.last_name(),
         "email": fake.email(),
-        "hashed_password": hash_password("MySuperPassword$1234"),
+        "hashed_password": HASHED_DEFAULT_PASSWORD,
         "role": UserRole.AUTHENTICATED,
         "email_verified": False,
         "is_locked": False,
@@ -160,25 +245,23 @@ async def unverified_user(db_session):
     await db_session.commit()
     return user
 
-@pytest.fixture(scope="function")
-async def users_with_same_role_50_users(db_session):
-    users = []
-    for _ in range(50):
-        user_data = {
-            "nickname": fake.user_name(),
+# shared read-only dataset: committed once per test run and visible to every test through its SAVEPOINT
+@pytest.fixture(scope="session")
+async def users_with_same_role_50_users(test_engine):
+    rows = [
+        {
+            "nickname": f"bulk_user_{i}",
             "first_name": fake.first_name(),
             "last_name": fake.last_name(),
-            "email": fake.email(),
-            "hashed_password": fake.password(),
+            "email": f"bulk_user_{i}@example.com",
+            "hashed_password": HASHED_DEFAULT_PASSWORD,
             "role": UserRole.AUTHENTICATED,
             "email_verified": False,
             "is_locked": False,
         }
-        user = User(**user_data)
-        db_session.add(user)
-        users.append(user)
-    await db_session.commit()
-    return users
+        for i in range(50)
+    ]
+    return await _bulk_insert_users(test_engine, rows)
 
 @pytest.fixture
 async def admin_user(db_session: AsyncSession):
@@ -239,98 +322,53 @@ def email_service():
         mock_service.send_user_email.return_value = None
         return mock_service
 
-@pytest.fixture(scope="function")
-async def specific_nickname_user(db_session: AsyncSession):
-    user = User(
-        nickname="specific_nickname",
-        email="specific_nickname@example.com",
-        first_name="Specific",
-        last_name="Nickname",
-        hashed_password="securepassword",
-        role=UserRole.AUTHENTICATED,
-        is_locked=False,
-    )
-    db_session.add(user)
-    await db_session.commit()
-    return user
-
-@pytest.fixture(scope="function")
-async def specific_email_user(db_session: AsyncSession):
-    user = User(
-        nickname="emailuser",
-        email="specific_email@example.com",
-        first_name="Email",
-        last_name="User",
-        hashed_password="securepassword",
-        role=UserRole.AUTHENTICATED,
-        is_locked=False,
-    )
-    db_session.add(user)
-    await db_session.commit()
-    return user
-
-@pytest.fixture(scope="function")
-async def role_user(db_session: AsyncSession):
-    user = User(
-        nickname="roleuser",
-        email="role_user@example.com",
-        first_name="Role",
-        last_name="User",
-        hashed_password="securepassword",
-        role=UserRole.MANAGER,
-        is_locked=False,
-    )
-    db_session.add(user)
-    await db_session.commit()
-    return user
+def _search_corpus_row(nickname, email, *, created_at, role=UserRole.AUTHENTICATED, is_locked=False):
+    # created_at is required: every row must carry the same keys to stay in one batched INSERT
+    first_name, _, last_name = nickname.partition("_")
+    return {
+        "nickname": nickname,
+        "email": email,
+        "first_name": first_name.capitalize(),
+        "last_name": last_name.capitalize() or "User",
+        "hashed_password": "securepassword",
+        "role": role,
+        "is_locked": is_locked,
+        "created_at": created_at,
+    }
 
-@pytest.fixture(scope="function")
-async def locked_and_unlocked_users(db_session: AsyncSession):
-    locked_user = User(
-        nickname="lockeduser",
-        email="locked_user@example.com",
-        first_name="Locked",
-        last_name="User",
-        hashed_password="securepassword",
-        role=UserRole.AUTHENTICATED,
-        is_locked=True,
-    )
-    unlocked_user = User(
-        nickname="unlockeduser",
-        email="unlocked_user@example.com",
-        first_name="Unlocked",
-        last_name="User",
-        hashed_password="securepassword",
-        role=UserRole.AUTHENTICATED,
-        is_locked=False,
-    )
-    db_session.add_all([locked_user, unlocked_user])
-    await db_session.commit()
-    return locked_user, unlocked_user
+# a single clock reading for the run, so seeded creation dates and date-range assertions cannot drift apart
+@pytest.fixture(scope="session")
+def reference_now():
+    return datetime.utcnow()
 
-@pytest.fixture(scope="function")
-async def users_with_dates(db_session: AsyncSession):
-    now = datetime.utcnow()
-    old_user = User(
-        nickname="olduser",
-        email="old_user@example.com",
-        first_name="Old",
-        last_name="User",
-        hashed_password="securepassword",
-        role=UserRole.AUTHENTICATED,
-        is_locked=False,
-        created_at=now - timedelta(days=10)
-    )
-    new_user = User(
-        nickname="newuser",
-        email="new_user@example.com",
-        first_name="New",
-        last_name="User",
-        hashed_password="securepassword",
-        role=UserRole.AUTHENTICATED,
-        is_locked=False,
-        created_at=now
-    )
-    db_session.add_all([old_user, new_user])
-    await db_session.commit()
-    return old_user, new_user
+# one shared dataset covering every search predicate, committed once per run in a single batched INSERT
+@pytest.fixture(scope="session")
+async def search_corpus(test_engine, reference_now):
+    now = reference_now
+    rows = [
+        # nickname and email matches
+        _search_corpus_row("specific_nickname", "specific_nickname@example.com", created_at=now),
+        _search_corpus_row("emailuser", "specific_email@example.com", created_at=now),
+        _search_corpus_row("nickname_other", "nickname_other@example.com", created_at=now - timedelta(days=1)),
+        _search_corpus_row("email_other", "email_other@example.org", created_at=now - timedelta(days=2)),
+        # roles
+        _search_corpus_row("roleuser", "role_user@example.com", role=UserRole.MANAGER, created_at=now),
+        _search_corpus_row("manager_locked", "manager_locked@example.com", role=UserRole.MANAGER, is_locked=True, created_at=now - timedelta(days=3)),
+        _search_corpus_row("corpus_admin", "corpus_admin@example.com", role=UserRole.ADMIN, created_at=now - timedelta(days=4)),
+        _search_corpus_row("corpus_anonymous", "corpus_anonymous@example.com", role=UserRole.ANONYMOUS, created_at=now - timedelta(days=1)),
+        # account status
+        _search_corpus_row("lockeduser", "locked_user@example.com", is_locked=True, created_at=now),
+        _search_corpus_row("unlockeduser", "unlocked_user@example.com", created_at=now),
+        _search_corpus_row("locked_again", "locked_again@example.com", is_locked=True, created_at=now - timedelta(days=6)),
+        _search_corpus_row("unlocked_again", "unlocked_again@example.com", created_at=now - timedelta(days=2)),
+        # creation dates inside and outside the last five days
+        _search_corpus_row("newuser", "new_user@example.com", created_at=now),
+        _search_corpus_row("day_one", "day_one@example.com", created_at=now - timedelta(days=1)),
+        _search_corpus_row("day_three", "day_three@example.com", created_at=now - timedelta(days=3)),
+        _search_corpus_row("day_five", "day_five@example.com", created_at=now - timedelta(days=5)),
+        _search_corpus_row("day_six", "day_six@example.com", created_at=now - timedelta(days=6)),
+        _search_corpus_row("week_old", "week_old@example.com", created_at=now - timedelta(days=7)),
+        _search_corpus_row("olduser", "old_user@example.com", created_at=now - timedelta(days=10)),
+        _search_corpus_row("month_old", "month_old@example.com", created_at=now - timedelta(days=30)),
+    ]
+    return await _bulk_insert_users(test_engine, rows)
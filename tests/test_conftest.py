@@ -38,7 +38,9 @@ async def test_user_role(db_session, admin_user):
 
 @pytest.mark.asyncio
 async def test_bulk_user_creation_performance(db_session, users_with_same_role_50_users):
-    result = await db_session.execute(select(User).filter_by(role=UserRole.AUTHENTICATED))
+    # the dataset is shared across the test run, so count only its own rows
+    user_ids = [user.id for user in users_with_same_role_50_users]
+    result = await db_session.execute(select(User).filter(User.id.in_(user_ids), User.role == UserRole.AUTHENTICATED))
     users = result.scalars().all()
     assert len(users) == 50
 
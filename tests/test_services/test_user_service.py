@@ -1,19 +1,18 @@
-from builtins import range
-from datetime import datetime, timedelta
+from datetime import timedelta
+from uuid import uuid4
 import pytest
-from sqlalchemy import select
+from sqlalchemy import event, select
 from app.dependencies import get_settings
-from app.models.user_model import User, UserRole
+from app.models.user_model import UserRole
 from app.schemas.user_schemas import UserFilter
 from app.services.user_service import UserService
-from app.utils.nickname_gen import generate_nickname
 
 pytestmark = pytest.mark.asyncio
 
 # Test creating a user with valid data
-async def test_create_user_with_valid_data(db_session, email_service):
+async def test_create_user_with_valid_data(db_session, email_service, nickname_factory):
     user_data = {
-        "nickname": generate_nickname(),
+        "nickname": nickname_factory(),
         "email": "valid_user@example.com",
         "password": "ValidPassword123!",
         "role": UserRole.ADMIN.name
@@ -23,14 +22,15 @@ async def test_create_user_with_valid_data(db_session, email_service):
     assert user.email == user_data["email"]
 
 # Test creating a user with invalid data
-async def test_create_user_with_invalid_data(db_session, email_service):
+async def test_create_user_with_invalid_data(mock_db_session, email_service):
     user_data = {
         "nickname": "",  # Invalid nickname
         "email": "invalidemail",  # Invalid email
         "password": "short",  # Invalid password
     }
-    user = await UserService.create(db_session, user_data, email_service)
+    user = await UserService.create(mock_db_session, user_data, email_service)
     assert user is None
+    mock_db_session.execute.assert_not_called()
 
 # Test fetching a user by ID when the user exists
 async def test_get_by_id_user_exists(db_session, user):
@@ -39,10 +39,17 @@ async def test_get_by_id_user_exists(db_session, user):
 
 # Test fetching a user by ID when the user does not exist
 async def test_get_by_id_user_does_not_exist(db_session):
-    non_existent_user_id = "non-existent-id"
+    non_existent_user_id = uuid4()
     retrieved_user = await UserService.get_by_id(db_session, non_existent_user_id)
     assert retrieved_user is None
 
+# Test fetching a user by a malformed ID
+async def test_get_by_id_invalid_id(mock_db_session):
+    retrieved_user = await UserService.get_by_id(mock_db_session, "non-existent-id")
+    assert retrieved_user is None
+    # a malformed id is rejected before any round-trip
+    mock_db_session.get.assert_not_called()
+
 # Test fetching a user by nickname when the user exists
 async def test_get_by_nickname_user_exists(db_session, user):
     retrieved_user = await UserService.get_by_nickname(db_session, user.nickname)
@@ -63,6 +70,53 @@ async def test_get_by_email_user_does_not_exist(db_session):
     retrieved_user = await UserService.get_by_email(db_session, "non_existent_email@example.com")
     assert retrieved_user is None
 
+# Test a repeated email lookup being served from the session's lookup cache without a query
+async def test_get_by_email_repeated_lookup_issues_no_query(db_session, user):
+    statements = []
+
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    sync_connection = db_session.bind.sync_connection
+    event.listen(sync_connection, "before_cursor_execute", record_statement)
+    try:
+        first_lookup = await UserService.get_by_email(db_session, user.email)
+        assert statements, "The first lookup should query the database"
+        statements.clear()
+        second_lookup = await UserService.get_by_email(db_session, user.email)
+    finally:
+        event.remove(sync_connection, "before_cursor_execute", record_statement)
+    assert second_lookup is first_lookup
+    assert statements == [], "The repeated lookup should be resolved without a query"
+
+# Test email lookups after the email is changed through UserService.update
+async def test_get_by_email_after_update(db_session, user):
+    old_email = user.email
+    new_email = "cache_updated_email@example.com"
+    assert await UserService.get_by_email(db_session, old_email) is not None
+    await UserService.update(db_session, user.id, {"email": new_email})
+    assert UserService._lookup_cache_key not in db_session.info
+    assert await UserService.get_by_email(db_session, old_email) is None
+    retrieved_user = await UserService.get_by_email(db_session, new_email)
+    assert retrieved_user.id == user.id
+
+# Test a cached email lookup after the email is changed outside UserService
+async def test_get_by_email_after_direct_change(db_session, user):
+    old_email = user.email
+    assert await UserService.get_by_email(db_session, old_email) is not None
+    user.email = "cache_direct_email@example.com"
+    await db_session.flush()
+    # the cache is not cleared here, so the attribute check has to reject the stale entry
+    assert await UserService.get_by_email(db_session, old_email) is None
+
+# Test a cached nickname lookup after the user is deleted
+async def test_get_by_nickname_after_delete(db_session, user):
+    nickname = user.nickname
+    assert await UserService.get_by_nickname(db_session, nickname) is not None
+    await UserService.delete(db_session, user.id)
+    assert UserService._lookup_cache_key not in db_session.info
+    assert await UserService.get_by_nickname(db_session, nickname) is None
+
 # Test updating a user with valid data
 async def test_update_user_valid_data(db_session, user):
     new_email = "updated_email@example.com"
@@ -71,9 +125,11 @@ async def test_update_user_valid_data(db_session, user):
     assert updated_user.email == new_email
 
 # Test updating a user with invalid data
-async def test_update_user_invalid_data(db_session, user):
-    updated_user = await UserService.update(db_session, user.id, {"email": "invalidemail"})
+async def test_update_user_invalid_data(mock_db_session):
+    updated_user = await UserService.update(mock_db_session, uuid4(), {"email": "invalidemail"})
     assert updated_user is None
+    # update() swallows every exception, so make sure it was validation that stopped it
+    mock_db_session.execute.assert_not_called()
 
 # Test deleting a user who exists
 async def test_delete_user_exists(db_session, user):
@@ -82,7 +138,7 @@ async def test_delete_user_exists(db_session, user):
 
 # Test attempting to delete a user who does not exist
 async def test_delete_user_does_not_exist(db_session):
-    non_existent_user_id = "non-existent-id"
+    non_existent_user_id = uuid4()
     deletion_success = await UserService.delete(db_session, non_existent_user_id)
     assert deletion_success is False
 
@@ -92,12 +148,31 @@ async def test_list_users_with_pagination(db_session, users_with_same_role_50_us
     users_page_2 = await UserService.list_users(db_session, skip=10, limit=10)
     assert len(users_page_1) == 10
     assert len(users_page_2) == 10
-    assert users_page_1[0].id != users_page_2[0].id
+    assert not {user.id for user in users_page_1} & {user.id for user in users_page_2}
+    user_ids = [user.id for user in users_page_1 + users_page_2]
+    assert user_ids == sorted(user_ids)
+
+# Test listing users with keyset pagination
+async def test_list_users_with_cursor_pagination(db_session, users_with_same_role_50_users):
+    users_page_1 = await UserService.list_users(db_session, limit=10)
+    last_id = users_page_1[-1].id
+    users_page_2 = await UserService.list_users(db_session, cursor=last_id, limit=10)
+    assert len(users_page_1) == 10
+    assert len(users_page_2) == 10
+    assert not {user.id for user in users_page_1} & {user.id for user in users_page_2}
+    user_ids = [user.id for user in users_page_1 + users_page_2]
+    assert user_ids == sorted(user_ids)
+
+# Test that skip and cursor cannot be combined
+async def test_list_users_with_skip_and_cursor(mock_db_session):
+    with pytest.raises(ValueError):
+        await UserService.list_users(mock_db_session, skip=10, cursor=uuid4())
+    mock_db_session.execute.assert_not_called()
 
 # Test registering a user with valid data
-async def test_register_user_with_valid_data(db_session, email_service):
+async def test_register_user_with_valid_data(db_session, email_service, nickname_factory):
     user_data = {
-        "nickname": generate_nickname(),
+        "nickname": nickname_factory(),
         "email": "register_valid_user@example.com",
         "password": "RegisterValid123!",
         "role": UserRole.ADMIN
@@ -107,13 +182,14 @@ async def test_register_user_with_valid_data(db_session, email_service):
     assert user.email == user_data["email"]
 
 # Test attempting to register a user with invalid data
-async def test_register_user_with_invalid_data(db_session, email_service):
+async def test_register_user_with_invalid_data(mock_db_session, email_service):
     user_data = {
         "email": "registerinvalidemail",  # Invalid email
         "password": "short",  # Invalid password
     }
-    user = await UserService.register_user(db_session, user_data, email_service)
+    user = await UserService.register_user(mock_db_session, user_data, email_service)
     assert user is None
+    mock_db_session.execute.assert_not_called()
 
 # Test successful user login
 async def test_login_user_successful(db_session, verified_user):
@@ -137,9 +213,12 @@ async def test_login_user_incorrect_password(db_session, user):
 # Test account lock after maximum failed login attempts
 async def test_account_lock_after_failed_logins(db_session, verified_user):
     max_login_attempts = get_settings().max_login_attempts
-    for _ in range(max_login_attempts):
-        await UserService.login_user(db_session, verified_user.email, "wrongpassword")
-    
+    # start one attempt short of the limit instead of replaying every failed (bcrypt-verified) login
+    verified_user.failed_login_attempts = max_login_attempts - 1
+    await db_session.flush()
+    assert not await UserService.is_account_locked(db_session, verified_user.email)
+
+    await UserService.login_user(db_session, verified_user.email, "wrongpassword")
     is_locked = await UserService.is_account_locked(db_session, verified_user.email)
     assert is_locked, "The account should be locked after the maximum number of failed login attempts."
 
@@ -153,7 +232,7 @@ async def test_reset_password(db_session, user):
 async def test_verify_email_with_token(db_session, user):
     token = "valid_token_example"  # This should be set in your user setup if it depends on a real token
     user.verification_token = token  # Simulating setting the token in the database
-    await db_session.commit()
+    await db_session.flush()
     result = await UserService.verify_email_with_token(db_session, user.id, token)
     assert result is True
 
@@ -161,64 +240,69 @@ async def test_verify_email_with_token(db_session, user):
 async def test_unlock_user_account(db_session, locked_user):
     unlocked = await UserService.unlock_user_account(db_session, locked_user.id)
     assert unlocked, "The account should be unlocked"
-    refreshed_user = await UserService.get_by_id(db_session, locked_user.id)
-    assert not refreshed_user.is_locked, "The user should no longer be locked"
+    # the service loads locked_user through the session's identity map and commits the change on it
+    assert not locked_user.is_locked, "The user should no longer be locked"
+
+def _corpus_ids(search_corpus, predicate):
+    # the rows of the shared search corpus a search is expected to return, and nothing else
+    return {user.id for user in search_corpus if predicate(user)}
 
 # Test search users by username
-async def test_search_users_by_username(db_session, specific_nickname_user: User):
+async def test_search_users_by_username(db_session, search_corpus):
     search_params = UserFilter(username="specific_nickname")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.nickname for user in result_users])  # Debug output
-    assert any(user.nickname == "specific_nickname" for user in result_users), "No user found with the nickname 'specific_nickname'"
-
+    expected_ids = _corpus_ids(search_corpus, lambda user: "specific_nickname" in user.nickname)
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "Only the nickname 'specific_nickname' should match"
 
 # Test search users by email
-async def test_search_users_by_username(db_session, specific_nickname_user: User):
-    search_params = UserFilter(username="specific_nickname")
+async def test_search_users_by_email(db_session, search_corpus):
+    search_params = UserFilter(email="specific_email@example.com")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.nickname for user in result_users])  # Debug output
-    assert any(user.nickname == "specific_nickname" for user in result_users), "No user found with the nickname 'specific_nickname'"
+    expected_ids = _corpus_ids(search_corpus, lambda user: "specific_email@example.com" in user.email)
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "Only the email 'specific_email@example.com' should match"
 
 # Test search users by role
-async def test_search_users_by_role(db_session, role_user: User):
+async def test_search_users_by_role(db_session, search_corpus):
     search_params = UserFilter(role="MANAGER")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.role.name for user in result_users])  # Debug output
-    assert any(user.role == UserRole.MANAGER for user in result_users), "No user found with the role 'MANAGER'"
+    expected_ids = _corpus_ids(search_corpus, lambda user: user.role == UserRole.MANAGER)
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "Exactly the users with the role 'MANAGER' should match"
 
 # Test search users by locked account
-async def test_search_users_by_account_status_locked(db_session, locked_and_unlocked_users):
+async def test_search_users_by_account_status_locked(db_session, search_corpus):
     search_params = UserFilter(account_status="locked")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.nickname for user in result_users])  # Debug output
-    assert any(user.is_locked for user in result_users), "No user found with 'locked' account status"
+    expected_ids = _corpus_ids(search_corpus, lambda user: user.is_locked)
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "Exactly the users with 'locked' account status should match"
 
 # Test search users by unlocked account
-async def test_search_users_by_account_status_unlocked(db_session, locked_and_unlocked_users):
+async def test_search_users_by_account_status_unlocked(db_session, search_corpus):
     search_params = UserFilter(account_status="unlocked")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.nickname for user in result_users])  # Debug output
-    assert any(not user.is_locked for user in result_users), "No user found with 'unlocked' account status"
+    # more unlocked users exist than one page holds, so check the page instead of the full set
+    assert result_users, "No user found with 'unlocked' account status"
+    assert all(not user.is_locked for user in result_users), "Locked users should not match 'unlocked'"
 
 # Test search with given date range
-async def test_search_users_by_date_range(db_session, users_with_dates):
-    now = datetime.utcnow().date()
+async def test_search_users_by_date_range(db_session, search_corpus, reference_now):
+    now = reference_now.date()
     start_date = now - timedelta(days=5)
     end_date = now
     search_params = UserFilter(start_date=start_date, end_date=end_date)
     result_users = await UserService.search_users(db_session, search_params=search_params)
+    assert result_users, "No user found in the date range"
     assert all(start_date <= user.created_at.date() <= end_date for user in result_users)
 
 # Test search with no results
-async def test_search_users_with_no_results(db_session):
+async def test_search_users_with_no_results(db_session, search_corpus):
     search_params = UserFilter(username="non_existent_nickname")
     result_users = await UserService.search_users(db_session, search_params=search_params)
     assert len(result_users) == 0
 
 # Test when email already exists
-async def test_create_user_with_duplicate_email(db_session, email_service):
+async def test_create_user_with_duplicate_email(db_session, email_service, nickname_factory):
     user_data = {
-        "nickname": generate_nickname(),
+        "nickname": nickname_factory(),
         "email": "duplicate_email@example.com",
         "password": "UniquePassword123!",
         "role": UserRole.AUTHENTICATED.name
@@ -228,22 +312,22 @@ async def test_create_user_with_duplicate_email(db_session, email_service):
     assert user is None  # or assert an appropriate error is raised
 
 # Test partial username search
-async def test_search_users_by_partial_username_match(db_session, specific_nickname_user: User):
+async def test_search_users_by_partial_username_match(db_session, search_corpus):
     search_params = UserFilter(username="specific")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.nickname for user in result_users])  # Debug output
-    assert any(user.nickname == "specific_nickname" for user in result_users), "No user found with a partial username match"
+    expected_ids = _corpus_ids(search_corpus, lambda user: "specific" in user.nickname)
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "Only nicknames containing 'specific' should match"
 
 # Test partial email search
-async def test_search_users_by_partial_email_match(db_session, specific_email_user: User):
+async def test_search_users_by_partial_email_match(db_session, search_corpus):
     search_params = UserFilter(email="specific_email")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.email for user in result_users])  # Debug output
-    assert any(user.email == "specific_email@example.com" for user in result_users), "No user found with a partial email match"
+    expected_ids = _corpus_ids(search_corpus, lambda user: "specific_email" in user.email)
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "Only emails containing 'specific_email' should match"
 
 # Test no results with date range search
-async def test_search_users_by_date_range_no_results(db_session):
-    now = datetime.utcnow().date()
+async def test_search_users_by_date_range_no_results(db_session, search_corpus, reference_now):
+    now = reference_now.date()
     start_date = now + timedelta(days=10)
     end_date = now + timedelta(days=20)
     search_params = UserFilter(start_date=start_date, end_date=end_date)
@@ -251,8 +335,19 @@ async def test_search_users_by_date_range_no_results(db_session):
     assert len(result_users) == 0
 
 # Test case insensitive username search
-async def test_search_users_by_username_case_insensitivity(db_session, specific_nickname_user: User):
+async def test_search_users_by_username_case_insensitivity(db_session, search_corpus):
     search_params = UserFilter(username="SPECIFIC_NICKNAME")
     result_users = await UserService.search_users(db_session, search_params=search_params)
-    print("Result Users:", [user.nickname for user in result_users])  # Debug output
-    assert any(user.nickname == "specific_nickname" for user in result_users), "No user found with the username matching case-insensitive search"
\ No newline at end of file
+    expected_ids = _corpus_ids(search_corpus, lambda user: "specific_nickname" in user.nickname.lower())
+    assert expected_ids and {user.id for user in result_users} == expected_ids, "The username search should be case-insensitive"
+
+# Test counting filtered users, reusing the cached statement with new filter values
+async def test_count_filtered_users(db_session, search_corpus):
+    expected_locked = sum(1 for user in search_corpus if user.is_locked)
+    locked_count = await UserService.count_filtered_users(db_session, UserFilter(account_status="locked"))
+    assert locked_count == expected_locked
+
+    for role in (UserRole.MANAGER, UserRole.ADMIN):
+        expected_count = sum(1 for user in search_corpus if user.role == role)
+        role_count = await UserService.count_filtered_users(db_session, UserFilter(role=role.name))
+        assert role_count == expected_count, f"Count for role '{role.name}' should match the search corpus"